@@ -1,25 +1,96 @@
+import html
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
 import streamlit as st
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import datetime
 import re
-from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote_plus
+
+# pandas, numpy and google.genai are imported inside the functions that use
+# them so sessions that never generate or export a plan don't pay for them
 
 # Load environment variables
 load_dotenv()
 
+# Precompiled patterns for parsing the AI response
+_URL_RE = re.compile(r'(?<!\]\()(https?://[^\s\)]+)')
+_MD_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+_MD_LINK_HTML = r'<a href="\2" target="_blank">\1</a>'
+_TABLE_RE = re.compile(r'\|.*\|.*\n\|[-\s|]+\n(\|.*\n)+', re.MULTILINE)
+_SECTION_RE = re.compile(r'(?:##|^)(.*?)(?=##|\Z)', re.DOTALL)
+_FOOD_ACTIVITY_RE = re.compile(r'breakfast|lunch|dinner|coffee|snack')
+# '**Day N Total:** ...' summary lines, matched for every day in one scan
+_DAY_TOTAL_RE = re.compile(r'\*\*Day (.+?) Total:?\s*([^\*\n]+)', re.IGNORECASE)
+
+# Widget options, with value -> position maps for restoring each session's selection
+CURRENCIES = ("PHP", "USD", "EUR", "GBP", "JPY", "AUD", "CAD", "SGD", "HKD", "CNY")
+CURRENCY_IDX = {c: i for i, c in enumerate(CURRENCIES)}
+STYLES = ("Nature & Outdoors", "City & Culture", "Balanced Mix")
+STYLE_IDX = {s: i for i, s in enumerate(STYLES)}
+ACCOMMODATIONS = ("Budget Hostels", "Mid-range Hotels", "Luxury Hotels", "Boutique Hotels", "Vacation Rentals/Airbnb")
+ACCOMMODATION_IDX = {a: i for i, a in enumerate(ACCOMMODATIONS)}
+FOODS = ("Street Food & Local Eats", "Mix of Local & International", "Fine Dining", "Vegetarian/Vegan", "No Preference")
+FOOD_IDX = {f: i for i, f in enumerate(FOODS)}
+DEFAULT_ACTIVITIES = (
+    "Adventure Sports",
+    "Cultural & Historical Sites",
+    "Food & Dining",
+    "Shopping",
+    "Photography",
+    "Nightlife",
+    "Wellness & Spa",
+    "Beach & Water Activities",
+    "Art & Museums",
+    "Local Experiences"
+)
+
+# Uploaded documents and checkpointed plans live under one directory per
+# browser session; ones untouched for a day are swept as abandoned
+_STORAGE_ROOT = Path(tempfile.gettempdir()) / "freewen"
+_STORAGE_TTL = 24 * 60 * 60
+
+def sweep_storage(max_age=_STORAGE_TTL):
+    """Delete the storage directories of browser sessions idle for more than `max_age` seconds"""
+    if not _STORAGE_ROOT.is_dir():
+        return
+    cutoff = time.time() - max_age
+    for storage in _STORAGE_ROOT.iterdir():
+        try:
+            if storage.stat().st_mtime < cutoff:
+                shutil.rmtree(storage, ignore_errors=True)
+        except FileNotFoundError:
+            pass  # Removed by a concurrent sweep
+
+def touch_storage():
+    """Mark this browser session's storage directory as in use"""
+    try:
+        os.utime(_STORAGE_ROOT / st.session_state.storage_id)
+    except FileNotFoundError:
+        pass  # Nothing stored yet
+
 # Initialize session state for managing multiple travel plans
 if 'travel_sessions' not in st.session_state:
-    st.session_state.travel_sessions = []
+    st.session_state.travel_sessions = {}  # Keyed by session id, in creation order
 if 'active_session' not in st.session_state:
     st.session_state.active_session = None
 if 'session_counter' not in st.session_state:
     st.session_state.session_counter = 0
-if 'uploaded_files' not in st.session_state:
-    st.session_state.uploaded_files = {}
+if 'storage_id' not in st.session_state:
+    # Unique per browser session so uploaded files from different users never collide
+    st.session_state.storage_id = uuid.uuid4().hex
+    # Streamlit has no session-end hook, so new sessions clean up abandoned ones
+    sweep_storage()
+touch_storage()
 
 # Page configuration
 st.set_page_config(
@@ -33,8 +104,10 @@ st.set_page_config(
 if 'map_visible' not in st.session_state:
     st.session_state.map_visible = True
 
-# Custom CSS for fixed right panel with collapsible functionality
-st.markdown("""
+# Custom CSS for the fixed right map panel, tables and itinerary. Kept in one
+# <style> block so it goes out as a single element on each rerun; it can't be
+# skipped on later reruns because Streamlit drops elements that aren't re-sent.
+_APP_CSS = """
 <style>
     /* Fixed right panel for map */
     .map-panel {
@@ -130,12 +203,8 @@ st.markdown("""
         word-wrap: break-word;
         overflow-wrap: break-word;
     }
-</style>
-""", unsafe_allow_html=True)
-
-# Custom CSS for tables
-st.markdown("""
-<style>
+    
+    /* Tables */
     table {
         width: 100%;
         border-collapse: collapse;
@@ -180,8 +249,81 @@ st.markdown("""
         text-decoration: underline;
         color: #0D47A1;
     }
+    
+    /* Itinerary display */
+    .itinerary-table {
+        font-size: 13px;
+    }
+    .itinerary-table td {
+        padding: 10px 12px;
+        vertical-align: top;
+    }
+    .time-col {
+        font-weight: bold;
+        color: #1976D2;
+        white-space: nowrap;
+    }
+    .transport-row {
+        background-color: #E3F2FD !important;
+    }
+    .food-row {
+        background-color: #FFF3E0 !important;
+    }
+    .activity-row {
+        background-color: #F1F8E9 !important;
+    }
+    .day-header {
+        background-color: #4CAF50;
+        color: white;
+        padding: 15px;
+        margin-top: 20px;
+        margin-bottom: 10px;
+        border-radius: 5px;
+        font-size: 18px;
+        font-weight: bold;
+    }
+    .day-total {
+        background-color: rgba(28, 131, 225, 0.1);
+        color: #0054A3;
+        padding: 16px;
+        margin-bottom: 10px;
+        border-radius: 8px;
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_APP_CSS, unsafe_allow_html=True)
+
+# Fixed parts of the planning prompt, kept out of the per-call f-string
+_ITINERARY_REQUIREMENTS = """**CRITICAL REQUIREMENTS for Itinerary:**
+    1. Include specific times (e.g., 8:00 AM, not just "Morning")
+    2. ALWAYS include transportation between locations with:
+       - Mode of transport (Walk, Metro, Bus, Taxi, Train, etc.)
+       - Estimated duration
+       - Estimated cost
+       - Route details in Notes
+    3. Include ALL meal stops (Breakfast, Lunch, Dinner, Snacks/Coffee)
+    4. For food stops, specify:
+       - Restaurant/Cafe name
+       - Type of cuisine
+       - Recommended dishes in Notes
+       - Estimated meal cost
+    5. Activity Type must be one of: Breakfast, Lunch, Dinner, Coffee/Snack, Transportation, Sightseeing, Activity, Shopping, Rest
+    6. Every location must have a Map Link
+"""
+
+_OUTPUT_RULES = """**CRITICAL RULES:**
+    1. Use ONLY pipe-separated markdown tables (| column | column |)
+    2. Include table headers with separator row (|-------|-------|)
+    3. NO bullet points, NO numbered lists, NO other formats
+    4. Every table cell must be filled
+    5. All URLs must be complete https:// links
+    6. All prices in {currency}
+    7. Use Google Search for current, realistic prices
+    8. Tailor ALL content to the travel preferences
+    9. Create hour-by-hour detailed schedule with specific times
+    10. Include transportation between every location change
+    11. Include all meals (breakfast, lunch, dinner, snacks)
+    """
 
 # Initialize Gemini client
 @st.cache_resource
@@ -195,24 +337,79 @@ def get_gemini_client():
     
     if not api_key:
         raise ValueError("GEMINI_API_KEY is not set in Streamlit secrets or environment variables")
+    
+    from google import genai
     return genai.Client(api_key=api_key)
 
-def generate_travel_plan(origin, destination, start_date, end_date, budget, currency, preferences, num_travelers=1):
-    """Generate travel plan using Gemini with Google Search grounding"""
-    client = get_gemini_client()
+# Grounding tool and generation config are immutable, so build them once. No
+# spinner, since the regenerate worker threads have no script context to draw in
+@st.cache_resource(show_spinner=False)
+def get_generation_config():
+    from google.genai import types
     
-    # Configure grounding tool
     grounding_tool = types.Tool(
         google_search=types.GoogleSearch()
     )
     
-    config = types.GenerateContentConfig(
+    return types.GenerateContentConfig(
         tools=[grounding_tool]
     )
+
+_PLAN_CACHE_TTL = 60 * 60
+_PLAN_CACHE_SIZE = 128
+
+@st.cache_resource(show_spinner=False)
+def _plan_cache():
+    """Generated plan texts shared by all users, {plan args: (created, text)} oldest first
+
+    A plain dict rather than st.cache_data so a hit is only a lookup: the live
+    preview stays outside the cache and is never recorded and replayed.
+    """
+    return OrderedDict(), threading.Lock()
+
+def _lookup_plan(key):
+    """Plan text generated for `key` within the last hour, or None"""
+    plans, lock = _plan_cache()
+    with lock:
+        entry = plans.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > _PLAN_CACHE_TTL:
+            del plans[key]
+            return None
+        return entry[1]
+
+def _store_plan(key, travel_plan):
+    """Cache a freshly generated plan, evicting the oldest beyond `_PLAN_CACHE_SIZE`"""
+    plans, lock = _plan_cache()
+    with lock:
+        plans.pop(key, None)
+        plans[key] = (time.time(), travel_plan)
+        while len(plans) > _PLAN_CACHE_SIZE:
+            plans.popitem(last=False)
+
+def generate_travel_plan(origin, destination, start_date, end_date, budget, currency, preferences, num_travelers=1, client=None, preview=None):
+    """Generate travel plan using Gemini with Google Search grounding
+
+    Cached for an hour on the plan inputs so repeat generations with identical
+    details reuse the previous response while prices from the search grounding
+    stay reasonably current. `preferences` is a tuple of (key, value) pairs so it
+    can be hashed. When the plan is generated, the completed sections are
+    rendered into the `preview` placeholder (an st.empty()) while the response
+    is still streaming; a cache hit leaves it untouched.
+    """
+    cache_key = (origin, destination, start_date, end_date, budget, currency, preferences, num_travelers)
+    travel_plan = _lookup_plan(cache_key)
+    if travel_plan is not None:
+        return travel_plan
+    
+    client = client or get_gemini_client()
+    preferences = dict(preferences)
     
     # Format dates for URLs
     start_date_str = start_date.strftime('%Y-%m-%d')
     end_date_str = end_date.strftime('%Y-%m-%d')
+    start_date_long = start_date.strftime('%B %d, %Y')
     trip_duration = (end_date - start_date).days
     
     # Build preferences text
@@ -231,7 +428,7 @@ def generate_travel_plan(origin, destination, start_date, end_date, budget, curr
     I need help planning a trip with the following details:
     - Origin: {origin}
     - Destination: {destination}
-    - Travel dates: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')} ({trip_duration} days)
+    - Travel dates: {start_date_long} to {end_date.strftime('%B %d, %Y')} ({trip_duration} days)
     - Number of Travelers: {num_travelers} {"person" if num_travelers == 1 else "people"}
     - Total Budget: {budget:,.2f} {currency} (for all {num_travelers} {"traveler" if num_travelers == 1 else "travelers"})
     
@@ -269,36 +466,21 @@ def generate_travel_plan(origin, destination, start_date, end_date, budget, curr
     For EACH of the {trip_duration} days, create a detailed hour-by-hour itinerary following this structure:
     
     **Day 1 Example Format:**
-    | 1 | {start_date.strftime('%B %d, %Y')} | 8:00 AM | Breakfast | [Restaurant Name] | 1 hour | [Amount] | Walk/Hotel | [Cuisine type] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 9:30 AM | Transportation | [From Hotel to Attraction] | 30 min | [Amount] | Taxi/Metro/Bus | [Route details] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 10:00 AM | Sightseeing | [Attraction Name] | 2 hours | [Amount] | - | [Brief description] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 12:00 PM | Transportation | [From Attraction to Restaurant] | 15 min | [Amount] | Walk/Metro | [Route] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 12:30 PM | Lunch | [Restaurant Name] | 1.5 hours | [Amount] | - | [Cuisine, specialties] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 2:00 PM | Transportation | [To next location] | 20 min | [Amount] | Bus/Metro | [Route] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 2:30 PM | Activity | [Activity Name] | 2 hours | [Amount] | - | [Details] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 4:30 PM | Coffee/Snack | [Cafe Name] | 45 min | [Amount] | Walk | [Type of place] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 5:30 PM | Transportation | [To dinner area] | 25 min | [Amount] | Metro/Taxi | [Route] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 6:00 PM | Shopping/Activity | [Location] | 1.5 hours | [Amount] | - | [Details] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 7:30 PM | Dinner | [Restaurant Name] | 2 hours | [Amount] | Walk | [Cuisine, must-try dishes] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 9:30 PM | Transportation | [Back to Hotel] | 30 min | [Amount] | Taxi/Metro | [Route] | [Map Link] |
-    | 1 | {start_date.strftime('%B %d, %Y')} | 10:00 PM | Rest | Return to Hotel | - | - | - | End of day | - |
-    
-    **CRITICAL REQUIREMENTS for Itinerary:**
-    1. Include specific times (e.g., 8:00 AM, not just "Morning")
-    2. ALWAYS include transportation between locations with:
-       - Mode of transport (Walk, Metro, Bus, Taxi, Train, etc.)
-       - Estimated duration
-       - Estimated cost
-       - Route details in Notes
-    3. Include ALL meal stops (Breakfast, Lunch, Dinner, Snacks/Coffee)
-    4. For food stops, specify:
-       - Restaurant/Cafe name
-       - Type of cuisine
-       - Recommended dishes in Notes
-       - Estimated meal cost
-    5. Activity Type must be one of: Breakfast, Lunch, Dinner, Coffee/Snack, Transportation, Sightseeing, Activity, Shopping, Rest
-    6. Every location must have a Map Link
-    7. Tailor to "{preferences['pace']}" pace:
+    | 1 | {start_date_long} | 8:00 AM | Breakfast | [Restaurant Name] | 1 hour | [Amount] | Walk/Hotel | [Cuisine type] | [Map Link] |
+    | 1 | {start_date_long} | 9:30 AM | Transportation | [From Hotel to Attraction] | 30 min | [Amount] | Taxi/Metro/Bus | [Route details] | [Map Link] |
+    | 1 | {start_date_long} | 10:00 AM | Sightseeing | [Attraction Name] | 2 hours | [Amount] | - | [Brief description] | [Map Link] |
+    | 1 | {start_date_long} | 12:00 PM | Transportation | [From Attraction to Restaurant] | 15 min | [Amount] | Walk/Metro | [Route] | [Map Link] |
+    | 1 | {start_date_long} | 12:30 PM | Lunch | [Restaurant Name] | 1.5 hours | [Amount] | - | [Cuisine, specialties] | [Map Link] |
+    | 1 | {start_date_long} | 2:00 PM | Transportation | [To next location] | 20 min | [Amount] | Bus/Metro | [Route] | [Map Link] |
+    | 1 | {start_date_long} | 2:30 PM | Activity | [Activity Name] | 2 hours | [Amount] | - | [Details] | [Map Link] |
+    | 1 | {start_date_long} | 4:30 PM | Coffee/Snack | [Cafe Name] | 45 min | [Amount] | Walk | [Type of place] | [Map Link] |
+    | 1 | {start_date_long} | 5:30 PM | Transportation | [To dinner area] | 25 min | [Amount] | Metro/Taxi | [Route] | [Map Link] |
+    | 1 | {start_date_long} | 6:00 PM | Shopping/Activity | [Location] | 1.5 hours | [Amount] | - | [Details] | [Map Link] |
+    | 1 | {start_date_long} | 7:30 PM | Dinner | [Restaurant Name] | 2 hours | [Amount] | Walk | [Cuisine, must-try dishes] | [Map Link] |
+    | 1 | {start_date_long} | 9:30 PM | Transportation | [Back to Hotel] | 30 min | [Amount] | Taxi/Metro | [Route] | [Map Link] |
+    | 1 | {start_date_long} | 10:00 PM | Rest | Return to Hotel | - | - | - | End of day | - |
+    
+    """ + _ITINERARY_REQUIREMENTS + f"""    7. Tailor to "{preferences['pace']}" pace:
        - Relaxed: More breaks, leisurely meals, 2-3 main activities per day
        - Moderate: 3-4 activities with reasonable breaks
        - Packed: 5+ activities, quick meals, maximize experiences
@@ -324,36 +506,100 @@ def generate_travel_plan(origin, destination, start_date, end_date, budget, curr
     | **YOUR BUDGET** | **{budget:,.2f}** |
     | **DIFFERENCE** | **[Over/Under by amount]** |
     
-    **CRITICAL RULES:**
-    1. Use ONLY pipe-separated markdown tables (| column | column |)
-    2. Include table headers with separator row (|-------|-------|)
-    3. NO bullet points, NO numbered lists, NO other formats
-    4. Every table cell must be filled
-    5. All URLs must be complete https:// links
-    6. All prices in {currency}
-    7. Use Google Search for current, realistic prices
-    8. Tailor ALL content to the travel preferences
-    9. Create hour-by-hour detailed schedule with specific times
-    10. Include transportation between every location change
-    11. Include all meals (breakfast, lunch, dinner, snacks)
-    """
+    """ + _OUTPUT_RULES.format(currency=currency)
     
-    # Generate content with grounding
-    response = client.models.generate_content(
+    # Generate content with grounding, streaming chunks as they arrive
+    stream = client.models.generate_content_stream(
         # model="gemini-2.0-flash-exp",
         model="gemini-2.5-flash",
         contents=prompt,
-        config=config,
+        config=get_generation_config(),
     )
     
-    print(response.text)
-    return response.text
+    # Show each section as soon as the next heading arrives; the preview is
+    # cleared once the plan is complete, or when the stream fails so a partial
+    # plan is never left on screen
+    parts = []
+    rendered_upto = 0
+    try:
+        for chunk in stream:
+            if not chunk.text:
+                continue
+            parts.append(chunk.text)
+            if preview is not None and '#' in chunk.text:
+                partial_plan = "".join(parts)
+                boundary = partial_plan.rfind('\n##')
+                if boundary > rendered_upto:
+                    rendered_upto = boundary
+                    with preview.container():
+                        render_travel_plan(_parse_plan_sections(partial_plan[:boundary]))
+    finally:
+        if preview is not None:
+            preview.empty()
+    
+    travel_plan = "".join(parts)
+    print(travel_plan)
+    _store_plan(cache_key, travel_plan)
+    return travel_plan
+
+def session_preferences(session):
+    """Build the preferences dict for generate_travel_plan from a session"""
+    return {
+        'pace': session['pace'],
+        'style': session['style'],
+        'activities': ', '.join(session['activities']) if session['activities'] else 'General sightseeing',
+        'accommodation': session['accommodation'],
+        'food': session['food']
+    }
+
+def session_plan_args(session):
+    """Positional arguments for generate_travel_plan from a session's trip details"""
+    return (
+        session['origin'],
+        session['destination'],
+        session['start_date'],
+        session['end_date'],
+        session['budget'],
+        session['currency'],
+        tuple(sorted(session_preferences(session).items())),
+        session.get('num_travelers', 1),
+    )
+
+def stale_sessions():
+    """Sessions with complete trip details whose plan is missing or was generated from other details"""
+    return [
+        session for session in st.session_state.travel_sessions.values()
+        if session['origin'] and session['destination']
+        and session['start_date'] < session['end_date'] and session['budget'] > 0
+        and session.get('plan_args') != session_plan_args(session)
+    ]
+
+def generate_travel_plans(sessions, max_workers=4):
+    """Generate plans for several sessions concurrently
+
+    Gemini calls are I/O bound, so a thread pool finishes the batch in about
+    the time of the slowest request. Results are stored on each session;
+    returns a "name: error" message for each session that failed.
+    """
+    client = get_gemini_client()
+    plan_args = [session_plan_args(session) for session in sessions]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(generate_travel_plan, *args, client=client) for args in plan_args]
+    
+    failures = []
+    for session, args, future in zip(sessions, plan_args, futures):
+        try:
+            session['travel_plan'] = future.result()
+        except Exception as e:
+            failures.append(f"{session['name']}: {e}")
+            continue
+        session['dataframes'] = None
+        session['parsed_plan'] = None
+        session['plan_args'] = args
+    return failures
 
 def mask_url(text, link_text="🔗 Link"):
     """Convert raw URLs to masked markdown links"""
-    # Pattern to match URLs
-    url_pattern = r'(https?://[^\s\)]+)'
-    
     # Replace URLs with masked links
     def replace_url(match):
         url = match.group(1)
@@ -369,11 +615,37 @@ def mask_url(text, link_text="🔗 Link"):
     
     # Only mask URLs that aren't already in markdown format
     # Don't mask if already in format [text](url)
-    masked_text = re.sub(r'(?<!\]\()' + url_pattern, replace_url, text)
+    masked_text = _URL_RE.sub(replace_url, text)
     return masked_text
 
-def parse_markdown_table(table_text):
-    """Parse a markdown table into a pandas DataFrame"""
+# Link texts mask_url gives raw URLs; they carry no information of their own
+_MASKED_URL_TEXTS = frozenset({"✈️ Book Flight", "🏨 Book Hotel", "📍 View Map", "🔗 Link"})
+
+def _plain_link(match):
+    """Plain-text form of a markdown link that still keeps its URL"""
+    text, url = match.groups()
+    return url if text in _MASKED_URL_TEXTS else f"{text} ({url})"
+
+def _replace_markdown_links(col, repl):
+    """Rewrite markdown links in a string column, skipping cells without a '['"""
+    has_link = col.str.contains('[', regex=False)
+    if not has_link.any():
+        return col
+    
+    col = col.copy()
+    col[has_link] = col[has_link].str.replace(_MD_LINK_RE, repl, regex=True)
+    return col
+
+def parse_markdown_table(table_text, html_links=True):
+    """Parse a markdown table into a pandas DataFrame
+
+    Markdown links become HTML anchors. With html_links=False, for tables shown
+    through st.dataframe, link columns keep just the URL, links in other columns
+    become "text (url)" (just the URL for masked raw URLs), and bold markers are
+    dropped.
+    """
+    import pandas as pd
+    
     lines = [line.strip() for line in table_text.strip().split('\n') if line.strip()]
     
     if len(lines) < 3:  # Need at least header, separator, and one data row
@@ -393,227 +665,491 @@ def parse_markdown_table(table_text):
     if data:
         df = pd.DataFrame(data, columns=headers)
         
-        # Convert markdown links to HTML in all columns
-        for col in df.columns:
-            df[col] = df[col].apply(convert_markdown_links_to_html)
+        if html_links:
+            # Convert markdown links to HTML in all columns
+            df = df.astype(str).apply(lambda col: _replace_markdown_links(col, _MD_LINK_HTML))
+        else:
+            df = df.astype(str).apply(
+                lambda col: _replace_markdown_links(col, r'\2' if col.name.endswith('Link') else _plain_link)
+                .str.replace('**', '', regex=False)
+            )
         
         return df
     return None
 
 def convert_markdown_links_to_html(text):
     """Convert markdown links [text](url) to HTML clickable links"""
+    import pandas as pd
+    
     if pd.isna(text):
         return text
     
-    # Pattern to match markdown links: [text](url)
-    pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-    
-    def replace_link(match):
-        link_text = match.group(1)
-        url = match.group(2)
-        return f'<a href="{url}" target="_blank">{link_text}</a>'
+    text = str(text)
+    if '[' not in text:
+        return text
     
-    return re.sub(pattern, replace_link, str(text))
+    return _MD_LINK_RE.sub(_MD_LINK_HTML, text)
 
-def parse_and_display_travel_plan(travel_plan, currency, trip_duration, start_date):
-    """Parse and beautifully display the travel plan with tables and organized sections"""
+def itinerary_table_html(day_data):
+    """Render one day of the itinerary as an HTML table with rows color coded by activity type"""
+    import numpy as np
+    import pandas as pd
+    
+    display_df = day_data.drop(columns=['Day', 'Date'], errors='ignore').fillna('-')
+    if 'Time' in display_df.columns:
+        display_df['Time'] = '<span class="time-col">' + display_df['Time'].astype(str) + '</span>'
+    
+    # Determine row color based on activity type
+    if 'Activity Type' in day_data.columns:
+        activity_type = day_data['Activity Type'].astype(str).str.lower()
+    else:
+        activity_type = pd.Series('', index=day_data.index)
+    row_classes = np.select(
+        [
+            activity_type.str.contains('transport', regex=False),
+            activity_type.str.contains(_FOOD_ACTIVITY_RE),
+        ],
+        ['transport-row', 'food-row'],
+        default='activity-row'
+    )
     
-    # Store all dataframes for Excel export
+    # Body rows are the only bare <tr> tags in the output, so tag them in order
+    table_html = display_df.to_html(escape=False, index=False, classes='itinerary-table', justify='left')
+    head, *rows = table_html.split('<tr>')
+    return head + "".join(
+        f'<tr class="{row_class}">{row}' for row_class, row in zip(row_classes.tolist(), rows)
+    )
+
+# Section title keywords mapped to the section kind and its display header
+_SECTION_KINDS = (
+    ('FLIGHT', 'Flights'),
+    ('HOTEL', 'Hotels'),
+    ('ITINERARY', 'Itinerary'),
+    ('BUDGET', 'Budget'),
+    ('MAP', 'Map'),
+)
+_SECTION_HEADERS = {
+    'Flights': "✈️ Flight Options",
+    'Hotels': "🏨 Hotel Recommendations",
+    'Itinerary': "📅 Detailed Daily Itinerary",
+    'Budget': "💰 Budget Breakdown",
+    'Map': "🗺️ Destination Map",
+}
+
+# Sections shown with st.dataframe; the itinerary keeps its color-coded HTML table
+_DATAFRAME_SECTIONS = ('Flights', 'Hotels', 'Budget')
+_BOOKING_LINK_TEXT = {
+    'Flights': "✈️ Book Flight",
+    'Hotels': "🏨 Book Hotel",
+}
+
+def _link_column_config(kind, df):
+    """LinkColumn config for the link columns of a table shown with st.dataframe"""
+    return {
+        col: st.column_config.LinkColumn(
+            col,
+            display_text="📍 View Map" if 'Map' in col else _BOOKING_LINK_TEXT.get(kind, "🔗 Link")
+        )
+        for col in df.columns if col.endswith('Link')
+    }
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _parse_plan_sections(travel_plan):
+    """Parse the travel plan text into its sections and tables
+
+    Returns a dict with 'sections', a list in response order where each entry
+    holds the section 'kind' (None for untitled text), its raw 'text', the
+    parsed 'df' (None when no table was found) and the itinerary 'day_totals'
+    keyed by day, and 'dataframes', the parsed tables keyed by kind for export.
+    """
+    sections = []
     all_dataframes = {}
     
     # Mask all URLs in the travel plan
     travel_plan = mask_url(travel_plan)
     
-    # Display with better formatting
-    sections = travel_plan.split('##')
-    
-    for section in sections:
+    # Each match is the text between two '##' markers (or before the first one)
+    for section_match in _SECTION_RE.finditer(travel_plan):
+        section = section_match.group(1)
         if not section.strip():
             continue
         
         # Get the section title (first line)
-        section_lines = section.strip().split('\n')
-        section_title = section_lines[0].strip().upper() if section_lines else ""
+        section_title = section.lstrip().split('\n', 1)[0].strip().upper()
         
         # Check section type based on title only
-        if 'FLIGHT' in section_title:
-            st.header("✈️ Flight Options")
-            
-            # Try to extract markdown table
-            table_match = re.search(r'\|.*\|.*\n\|[-\s|]+\n(\|.*\n)+', section, re.MULTILINE)
-            if table_match:
-                df_flights = parse_markdown_table(table_match.group(0))
-                if df_flights is not None and not df_flights.empty:
-                    # Display as HTML table for clickable links (single display)
-                    st.markdown(df_flights.to_html(escape=False, index=False), unsafe_allow_html=True)
-                    all_dataframes['Flights'] = df_flights
-                else:
-                    st.markdown(section)
-            else:
-                st.markdown(section)
-            
-        elif 'HOTEL' in section_title:
-            st.header("🏨 Hotel Recommendations")
-            
-            # Try to extract markdown table
-            table_match = re.search(r'\|.*\|.*\n\|[-\s|]+\n(\|.*\n)+', section, re.MULTILINE)
-            if table_match:
-                df_hotels = parse_markdown_table(table_match.group(0))
-                if df_hotels is not None and not df_hotels.empty:
-                    st.markdown(df_hotels.to_html(escape=False, index=False), unsafe_allow_html=True)
-                    all_dataframes['Hotels'] = df_hotels
-                else:
-                    st.markdown(section)
-            else:
-                st.markdown(section)
-            
-        elif 'ITINERARY' in section_title:
-            st.header("📅 Detailed Daily Itinerary")
-            
-            # Add custom CSS for better itinerary display (apply once)
-            st.markdown("""
-            <style>
-                .itinerary-table {
-                    font-size: 13px;
-                }
-                .itinerary-table td {
-                    padding: 10px 12px;
-                    vertical-align: top;
-                }
-                .time-col {
-                    font-weight: bold;
-                    color: #1976D2;
-                    white-space: nowrap;
-                }
-                .transport-row {
-                    background-color: #E3F2FD !important;
-                }
-                .food-row {
-                    background-color: #FFF3E0 !important;
-                }
-                .activity-row {
-                    background-color: #F1F8E9 !important;
-                }
-                .day-header {
-                    background-color: #4CAF50;
-                    color: white;
-                    padding: 15px;
-                    margin-top: 20px;
-                    margin-bottom: 10px;
-                    border-radius: 5px;
-                    font-size: 18px;
-                    font-weight: bold;
-                }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            # Try to extract markdown table
-            table_match = re.search(r'\|.*\|.*\n\|[-\s|]+\n(\|.*\n)+', section, re.MULTILINE)
-            if table_match:
-                df_itinerary = parse_markdown_table(table_match.group(0))
-                if df_itinerary is not None and not df_itinerary.empty:
-                    # Group by day for display
-                    if 'Day' in df_itinerary.columns:
-                        unique_days = df_itinerary['Day'].unique()
-                        for day in unique_days:
-                            day_data = df_itinerary[df_itinerary['Day'] == day].copy()
-                            date_val = day_data['Date'].iloc[0] if 'Date' in day_data.columns else ""
-                            
-                            # Display day header
-                            st.markdown(f'<div class="day-header">📆 Day {day} - {date_val}</div>', unsafe_allow_html=True)
-                            
-                            # Create table for this day
-                            display_html = '<div class="itinerary-table">'
-                            display_html += '<table style="width:100%; border-collapse: collapse; margin-bottom: 20px;">'
-                            
-                            # Custom headers (exclude Day and Date columns)
-                            display_html += '<thead><tr style="background-color: #4CAF50; color: white;">'
-                            for col in day_data.columns:
-                                if col not in ['Day', 'Date']:
-                                    display_html += f'<th style="padding: 12px; border: 1px solid #ddd;">{col}</th>'
-                            display_html += '</tr></thead><tbody>'
-                            
-                            # Add rows with color coding
-                            for idx, row in day_data.iterrows():
-                                activity_type = str(row.get('Activity Type', '')).lower()
-                                
-                                # Determine row color based on activity type
-                                row_class = ''
-                                if 'transport' in activity_type:
-                                    row_class = 'transport-row'
-                                elif any(meal in activity_type for meal in ['breakfast', 'lunch', 'dinner', 'coffee', 'snack']):
-                                    row_class = 'food-row'
-                                else:
-                                    row_class = 'activity-row'
-                                
-                                display_html += f'<tr class="{row_class}">'
-                                for col in day_data.columns:
-                                    if col not in ['Day', 'Date']:
-                                        cell_value = str(row[col]) if pd.notna(row[col]) else '-'
-                                        # Add special styling for time column
-                                        if col == 'Time':
-                                            display_html += f'<td class="time-col" style="border: 1px solid #ddd;">{cell_value}</td>'
-                                        else:
-                                            display_html += f'<td style="border: 1px solid #ddd;">{cell_value}</td>'
-                                display_html += '</tr>'
-                            
-                            display_html += '</tbody></table></div>'
-                            st.markdown(display_html, unsafe_allow_html=True)
-                            
-                            # Look for daily total in text after table
-                            day_total_pattern = rf'\*\*Day {day} Total:?\s*([^\*\n]+)'
-                            total_match = re.search(day_total_pattern, section, re.IGNORECASE)
-                            if total_match:
-                                total_text = total_match.group(1).strip()
-                                st.info(f"💵 {total_text}")
-                            
-                            # Add a divider between days
-                            st.markdown("---")
-                        
-                        all_dataframes['Itinerary'] = df_itinerary
-                    else:
-                        st.markdown(df_itinerary.to_html(escape=False, index=False), unsafe_allow_html=True)
-                        all_dataframes['Itinerary'] = df_itinerary
-                else:
-                    st.markdown(section)
-            else:
-                st.markdown(section)
-                    
-        elif 'BUDGET' in section_title:
-            st.header("💰 Budget Breakdown")
-            
-            # Try to extract markdown table
-            table_match = re.search(r'\|.*\|.*\n\|[-\s|]+\n(\|.*\n)+', section, re.MULTILINE)
+        kind = next((name for keyword, name in _SECTION_KINDS if keyword in section_title), None)
+        
+        # Try to extract markdown table
+        df = None
+        day_totals = {}
+        if kind in ('Flights', 'Hotels', 'Itinerary', 'Budget'):
+            table_match = _TABLE_RE.search(section)
             if table_match:
-                df_budget = parse_markdown_table(table_match.group(0))
-                if df_budget is not None and not df_budget.empty:
-                    st.markdown(df_budget.to_html(escape=False, index=False), unsafe_allow_html=True)
-                    all_dataframes['Budget'] = df_budget
-                else:
-                    st.markdown(section)
-            else:
-                st.markdown(section)
+                df = parse_markdown_table(table_match.group(0), html_links=kind not in _DATAFRAME_SECTIONS)
+                if df is not None and df.empty:
+                    df = None
+            if df is not None:
+                all_dataframes[kind] = df
+        
+        # Look for daily totals in text after the itinerary table
+        if kind == 'Itinerary' and df is not None and 'Day' in df.columns:
+            found_totals = {}
+            for day, total in _DAY_TOTAL_RE.findall(section):
+                found_totals.setdefault(day, total.strip())
+            day_totals = {day: found_totals[day] for day in df['Day'].unique() if day in found_totals}
+        
+        sections.append({'kind': kind, 'text': section, 'df': df, 'day_totals': day_totals})
+    
+    return {'sections': sections, 'dataframes': all_dataframes}
+
+def render_travel_plan(parsed_plan):
+    """Display a parsed travel plan with tables and organized sections"""
+    for section in parsed_plan['sections']:
+        kind = section['kind']
+        df = section['df']
+        
+        if kind:
+            st.header(_SECTION_HEADERS[kind])
+        
+        if df is None:
+            st.markdown(section['text'])
+        elif kind == 'Itinerary' and 'Day' in df.columns:
+            # Build every day into one HTML block so the section is sent in a single message
+            page_html = []
+            for day, day_data in df.groupby('Day', sort=False):
+                date_val = day_data['Date'].iloc[0] if 'Date' in day_data.columns else ""
+                
+                # Day header
+                page_html.append(f'<div class="day-header">📆 Day {day} - {date_val}</div>')
+                
+                # Table for this day
+                page_html.append(itinerary_table_html(day_data))
+                
+                # Daily total found after the table
+                if day in section['day_totals']:
+                    page_html.append(f'<div class="day-total">💵 {section["day_totals"][day]}</div>')
                 
-        elif 'DESTINATION MAP' in section_title or 'MAP' in section_title:
-            st.header("🗺️ Destination Map")
-            st.markdown(section)
+                # Add a divider between days
+                page_html.append('<hr>')
             
+            st.markdown("\n".join(page_html), unsafe_allow_html=True)
+        elif kind in _DATAFRAME_SECTIONS:
+            st.dataframe(df, column_config=_link_column_config(kind, df), hide_index=True, use_container_width=True)
         else:
-            # Display other sections normally
-            if section.strip():
-                st.markdown(section)
-    
-    return all_dataframes
+            # Display as HTML table for clickable links
+            st.markdown(df.to_html(escape=False, index=False), unsafe_allow_html=True)
+
+def parse_and_display_travel_plan(travel_plan, currency, trip_duration, start_date, parsed_plan=None):
+    """Parse and beautifully display the travel plan with tables and organized sections
+
+    Returns the parsed plan, whose 'dataframes' feed the Excel export. Passing a
+    previously returned `parsed_plan` renders it again without re-parsing.
+    """
+    if parsed_plan is None:
+        parsed_plan = _parse_plan_sections(travel_plan)
+    render_travel_plan(parsed_plan)
+    return parsed_plan
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def create_excel_export(_dataframes, destination, travel_plan):
+    """Create an Excel file with multiple sheets from dataframes
 
-def create_excel_export(dataframes, destination):
-    """Create an Excel file with multiple sheets from dataframes"""
+    Returns the workbook bytes, cached so reruns that reach the download button
+    don't rebuild it. The dataframes are parsed from `travel_plan`, so the plan
+    text is hashed as their fingerprint instead of the frames themselves.
+    """
+    from io import BytesIO
+    
+    import pandas as pd
+    
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for sheet_name, df in dataframes.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    # constant_memory flushes each row once a later row is started, so rows are
+    # written in order here; DataFrame.to_excel writes column by column and
+    # would lose cells. strings_to_urls is off since cells hold <a> tags.
+    with pd.ExcelWriter(
+        output,
+        engine='xlsxwriter',
+        engine_kwargs={'options': {'constant_memory': True, 'strings_to_urls': False}}
+    ) as writer:
+        header_format = writer.book.add_format({'bold': True, 'border': 1})
+        for sheet_name, df in _dataframes.items():
+            worksheet = writer.book.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, df.columns, header_format)
+            for row_num, row in enumerate(df.itertuples(index=False, name=None), start=1):
+                worksheet.write_row(row_num, 0, row)
+    
+    return output.getvalue()
+
+def session_dir(session_id):
+    """Directory holding a travel session's checkpoint and uploaded documents
+
+    Uploaded bytes and the plans of inactive sessions are kept on disk rather
+    than in session state so they don't grow the per-user session for its
+    whole lifetime. The directories are private to the server user, and
+    `sweep_storage` removes them once the browser session has been idle for
+    `_STORAGE_TTL`.
+    """
+    storage = _STORAGE_ROOT / st.session_state.storage_id
+    path = storage / str(session_id)
+    for directory in (_STORAGE_ROOT, storage, path):
+        directory.mkdir(mode=0o700, exist_ok=True)
+    return path
+
+def save_session(session):
+    """Checkpoint a session's plan to disk and drop it from memory
+
+    The parsed dataframes are derived from the plan text, so only the text is
+    stored. `load_session` brings it back when the session is activated again.
+    """
+    if not session.get('travel_plan'):
+        return
+    checkpoint = {
+        'id': session['id'],
+        'saved_at': datetime.now().isoformat(timespec='seconds'),
+        'travel_plan': session['travel_plan'],
+    }
+    (session_dir(session['id']) / "session.json").write_text(json.dumps(checkpoint), encoding="utf-8")
+    session['travel_plan'] = None
+    session['dataframes'] = None
+    session['parsed_plan'] = None
+    session['checkpointed'] = True
+
+def load_session(session):
+    """Restore a checkpointed session's plan into memory
+
+    Returns False when the checkpoint is gone (e.g. swept or removed by a tmp
+    cleaner); the plan is then marked stale so it can be regenerated.
+    """
+    if not session.get('checkpointed'):
+        return True
+    try:
+        checkpoint = json.loads((session_dir(session['id']) / "session.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        del session['checkpointed']
+        session.pop('plan_args', None)
+        return False
+    session['travel_plan'] = checkpoint['travel_plan']
+    del session['checkpointed']
+    return True
+
+def activate_session(session_id):
+    """Make a session active, checkpointing the one it replaces"""
+    current = st.session_state.travel_sessions.get(st.session_state.active_session)
+    if current is not None and current['id'] != session_id:
+        save_session(current)
+    st.session_state.active_session = session_id
+
+def add_booking(session, booking):
+    """Add a booking to a session, keeping the type index and total size current"""
+    session['bookings'][booking['id']] = booking
+    session['bookings_by_type'].setdefault(booking['type'], []).append(booking['id'])
+    session['bookings_total_size'] += booking['size']
+
+def booking_table_html(bookings_list):
+    """One HTML table for a group of bookings, escaping the user-supplied names and notes"""
+    rows = []
+    for b in bookings_list:
+        notes = html.escape(b['notes']).replace('\n', '<br>')
+        rows.append(
+            f"<tr><td>📎 <b>{html.escape(b['name'])}</b></td><td>{b['uploaded_date']}</td>"
+            f"<td>{b['size'] / 1024:.1f} KB</td><td>{notes}</td></tr>"
+        )
+    return (
+        "<table><thead><tr><th>Document</th><th>Uploaded</th><th>Size</th><th>Notes</th></tr></thead>"
+        f"<tbody>{''.join(rows)}</tbody></table>"
+    )
+
+def remove_bookings(session, booking_ids):
+    """Remove bookings and their stored files from a session"""
+    for bid in booking_ids:
+        removed = session['bookings'].pop(bid)
+        Path(removed['path']).unlink(missing_ok=True)
+        type_ids = session['bookings_by_type'][removed['type']]
+        type_ids.remove(bid)
+        if not type_ids:
+            del session['bookings_by_type'][removed['type']]
+        session['bookings_total_size'] -= removed['size']
+
+def _reset_booking_pickers(session):
+    """Forget the download/delete selections, whose options are booking ids"""
+    for key in (f"download_select_{session['id']}", f"delete_select_{session['id']}"):
+        st.session_state.pop(key, None)
+
+def save_uploaded_bookings(session):
+    """Save Documents callback: store the uploader's files as bookings of the session"""
+    uploaded_files = st.session_state[f"uploader_{session['id']}"]
+    document_type = st.session_state[f"doc_type_{session['id']}"]
+    document_notes = st.session_state[f"notes_{session['id']}"]
+    
+    storage_dir = session_dir(session['id'])
+    for uploaded_file in uploaded_files:
+        # Write file bytes to disk, keeping only the path in the session
+        file_bytes = uploaded_file.getvalue()
+        file_path = storage_dir / f"{uuid.uuid4().hex}_{Path(uploaded_file.name).name}"
+        file_path.write_bytes(file_bytes)
+        
+        # Create booking entry
+        session['booking_counter'] += 1
+        add_booking(session, {
+            'id': session['booking_counter'],
+            'name': uploaded_file.name,
+            'type': document_type,
+            'size': len(file_bytes),
+            'file_type': uploaded_file.type,
+            'path': str(file_path),
+            'notes': document_notes,
+            'uploaded_date': datetime.now().strftime('%Y-%m-%d %H:%M')
+        })
+    st.session_state[f"bookings_saved_{session['id']}"] = len(uploaded_files)
+
+def delete_selected_bookings(session):
+    """Delete selected callback: remove the bookings picked in the delete multiselect"""
+    remove_bookings(session, st.session_state[f"delete_select_{session['id']}"])
+    _reset_booking_pickers(session)
+
+def clear_bookings(session):
+    """Clear All callback: remove every booking of the session"""
+    remove_bookings(session, list(session['bookings']))
+    _reset_booking_pickers(session)
+
+@lru_cache(maxsize=256)
+def _qp(text):
+    """URL-encode a place name for a query string or path, memoized since the same names repeat every rerun"""
+    return quote_plus(text)
+
+@lru_cache(maxsize=64)
+def _trip_summary_md(destination, origin, start_date, end_date, budget, currency, num_travelers):
+    """Markdown for the trip summary's two columns and its quick links
+
+    Pure in its arguments, so it is memoized across reruns.
+    """
+    summary_left = "\n\n".join([
+        f"**🌍 Destination:** {destination}",
+        f"**📅 Duration:** {(end_date - start_date).days} days",
+        f"**👥 Travelers:** {num_travelers} {'person' if num_travelers == 1 else 'people'}",
+    ])
+    summary_right = "\n\n".join([
+        f"**💰 Budget:** {budget:,.0f} {currency}",
+        f"**✈️ Dates:** {start_date.strftime('%b %d, %Y')} - {end_date.strftime('%b %d, %Y')}",
+    ])
+    
+    destination_encoded = _qp(destination)
+    quick_links = [
+        "### 🔗 Quick Links",
+        f"[📍 View {destination} on Maps](https://www.google.com/maps/search/{destination_encoded})",
+    ]
+    if origin:
+        quick_links.append(f"[🧭 Get Directions from {origin}](https://www.google.com/maps/dir/{_qp(origin)}/{destination_encoded})")
+    return summary_left, summary_right, "\n\n".join(quick_links)
+
+def render_trip_summary(session):
+    """Display the Trip Summary and Quick Links shown below a travel plan"""
+    if not session['destination']:
+        return
+    
+    summary_left, summary_right, quick_links = _trip_summary_md(
+        session['destination'],
+        session['origin'],
+        session['start_date'],
+        session['end_date'],
+        session['budget'],
+        session['currency'],
+        session.get('num_travelers', 1)
+    )
     
-    output.seek(0)
-    return output
+    trip_col1, trip_col2 = st.columns([2, 1])
+    with trip_col1:
+        st.markdown("### 📋 Trip Summary")
+        summary_col1, summary_col2 = st.columns(2)
+        summary_col1.markdown(summary_left)
+        summary_col2.markdown(summary_right)
+    trip_col2.markdown(quick_links)
+
+@lru_cache(maxsize=64)
+def build_map_html(loc_encoded, loc_display, map_visible):
+    """HTML for the fixed map panel, memoized since it only changes with the location or visibility"""
+    # Panel visibility class
+    panel_class = "" if map_visible else "hidden"
+    
+    # Create the simplified map panel (just the map)
+    return f"""
+    <style>
+        /* Apply content width adjustment */
+        section.main > div {{
+            padding-right: {'420px' if map_visible else '20px'} !important;
+        }}
+    </style>
+    
+    <div class="map-panel {panel_class}">
+        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;">
+            <h3 style="margin: 0;">🗺️ Travel Map</h3>
+        </div>
+        <iframe
+            width="100%"
+            height="500"
+            frameborder="0"
+            style="border:0; border-radius: 8px; display: block;"
+            src="https://maps.google.com/maps?q={loc_encoded}&t=&z=13&ie=UTF8&iwloc=&output=embed"
+            allowfullscreen>
+        </iframe>
+        <p style="font-size: 12px; color: #666; margin: 10px 0; text-align: center;">� {loc_display}</p>
+    </div>
+    """
+
+# Pin the map panel's close/open button to the top right of the page
+_MAP_BUTTON_CSS = """
+<style>
+    div[data-testid="column"]:has(button[key*="{key}"]) {{
+        position: fixed !important;
+        right: 20px !important;
+        top: 90px !important;
+        z-index: 1000 !important;
+        width: auto !important;
+    }}
+</style>
+"""
+_CLOSE_MAP_BUTTON_CSS = _MAP_BUTTON_CSS.format(key="close_map")
+_OPEN_MAP_BUTTON_CSS = _MAP_BUTTON_CSS.format(key="open_map")
+
+@st.fragment
+def _render_sessions_sidebar():
+    """List the travel sessions with select and delete buttons
+
+    Runs as a fragment so the list is rebuilt on its own; selecting or
+    deleting a session changes the whole page and triggers a full rerun.
+    """
+    if st.session_state.travel_sessions:
+        st.subheader("Your Travel Plans")
+        
+        for session in st.session_state.travel_sessions.values():
+            col1, col2 = st.columns([4, 1])
+            
+            with col1:
+                # Session name (editable)
+                session_label = f"{session['name']}"
+                if session['destination']:
+                    session_label += f" - {session['destination']}"
+                
+                if st.button(
+                    session_label,
+                    key=f"session_{session['id']}",
+                    use_container_width=True,
+                    type="primary" if st.session_state.active_session == session['id'] else "secondary"
+                ):
+                    activate_session(session['id'])
+                    st.rerun()
+            
+            with col2:
+                # Delete session button
+                if st.button("🗑️", key=f"delete_{session['id']}", help="Delete this travel plan"):
+                    st.session_state.travel_sessions.pop(session['id'], None)
+                    shutil.rmtree(session_dir(session['id']), ignore_errors=True)
+                    if st.session_state.active_session == session['id']:
+                        activate_session(next(iter(st.session_state.travel_sessions), None))
+                    st.rerun()
+    else:
+        st.info("👆 Click 'New Travel Plan' to start planning your trip!")
 
 # App Header
 st.title("✈️ FreeWen - Your Travel AI Companion")
@@ -640,6 +1176,7 @@ with st.sidebar:
             'end_date': datetime.now(),
             'currency': 'PHP',
             'budget': 100000.0,
+            'budgets': {'PHP': 100000.0},  # Last budget entered per currency
             'num_travelers': 1,
             'pace': 'Moderate',
             'style': 'Balanced Mix',
@@ -649,45 +1186,23 @@ with st.sidebar:
             'food': 'Mix of Local & International',
             'travel_plan': None,
             'dataframes': None,
-            'bookings': []  # Store uploaded bookings and tickets
+            'parsed_plan': None,
+            'bookings': {},  # Store uploaded bookings and tickets, keyed by booking id
+            'bookings_by_type': {},  # Document type -> booking ids
+            'bookings_total_size': 0,
+            'booking_counter': 0
         }
-        st.session_state.travel_sessions.append(new_session)
-        st.session_state.active_session = new_session['id']
+        st.session_state.travel_sessions[new_session['id']] = new_session
+        activate_session(new_session['id'])
         st.rerun()
     
     st.markdown("---")
     
     # Display existing sessions
-    if st.session_state.travel_sessions:
-        st.subheader("Your Travel Plans")
-        
-        for session in st.session_state.travel_sessions:
-            col1, col2 = st.columns([4, 1])
-            
-            with col1:
-                # Session name (editable)
-                session_label = f"{session['name']}"
-                if session['destination']:
-                    session_label += f" - {session['destination']}"
-                
-                if st.button(
-                    session_label,
-                    key=f"session_{session['id']}",
-                    use_container_width=True,
-                    type="primary" if st.session_state.active_session == session['id'] else "secondary"
-                ):
-                    st.session_state.active_session = session['id']
-                    st.rerun()
-            
-            with col2:
-                # Delete session button
-                if st.button("🗑️", key=f"delete_{session['id']}", help="Delete this travel plan"):
-                    st.session_state.travel_sessions = [s for s in st.session_state.travel_sessions if s['id'] != session['id']]
-                    if st.session_state.active_session == session['id']:
-                        st.session_state.active_session = st.session_state.travel_sessions[0]['id'] if st.session_state.travel_sessions else None
-                    st.rerun()
-    else:
-        st.info("👆 Click 'New Travel Plan' to start planning your trip!")
+    _render_sessions_sidebar()
+    
+    # Filled in after the main content has saved this run's trip details
+    regenerate_slot = st.container()
     
     st.markdown("---")
     st.markdown("### 💡 Tips")
@@ -698,67 +1213,144 @@ with st.sidebar:
     - Export each plan to Excel
     """)
 
+@st.fragment
+def _render_bookings(active_session):
+    """Upload, list, download and delete the travel documents of a session
+
+    Runs as a fragment: nothing outside the Bookings tab depends on the
+    documents, so uploads and deletions rerun only this tab.
+    """
+    # Bookings & Tickets Section
+    st.header("🎫 Bookings & Tickets")
+    st.markdown("Upload and manage your flight bookings, hotel confirmations, activity tickets, and other travel documents here.")
+    
+    # Initialize bookings store if not exists
+    if 'bookings' not in active_session:
+        active_session.update(bookings={}, bookings_by_type={}, bookings_total_size=0, booking_counter=0)
+    
+    # Upload section
+    st.subheader("📤 Upload Documents")
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        uploaded_files = st.file_uploader(
+            "Choose files to upload",
+            type=['pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx', 'txt'],
+            accept_multiple_files=True,
+            key=f"uploader_{active_session['id']}",
+            help="Upload your booking confirmations, tickets, vouchers, etc."
+        )
+    
+    with col2:
+        st.selectbox(
+            "Document Type",
+            options=["✈️ Flight Booking", "🏨 Hotel Confirmation", "🎟️ Activity Ticket", "🚗 Car Rental", "🚂 Train/Bus Ticket", "📄 Other"],
+            key=f"doc_type_{active_session['id']}"
+        )
+    
+    st.text_area(
+        "Notes (optional)",
+        placeholder="Add any notes about this booking...",
+        key=f"notes_{active_session['id']}",
+        height=100
+    )
+    
+    # Buttons mutate the bookings in on_click callbacks, which run before the
+    # fragment reruns, so the tab redraws without an explicit st.rerun()
+    if uploaded_files:
+        st.button("💾 Save Documents", type="primary", key=f"save_docs_{active_session['id']}",
+                  on_click=save_uploaded_bookings, args=(active_session,))
+    saved_count = st.session_state.pop(f"bookings_saved_{active_session['id']}", None)
+    if saved_count:
+        st.success(f"✅ {saved_count} document(s) saved successfully!")
+    
+    st.markdown("---")
+    
+    # Display saved bookings
+    st.subheader("📚 Saved Documents")
+    
+    if active_session['bookings']:
+        bookings = active_session['bookings']
+        
+        # Display by category, one table per document type
+        for doc_type, booking_ids in active_session['bookings_by_type'].items():
+            bookings_list = [bookings[bid] for bid in booking_ids]
+            with st.expander(f"{doc_type} ({len(bookings_list)})", expanded=True):
+                st.markdown(booking_table_html(bookings_list), unsafe_allow_html=True)
+        
+        # A single download and delete control for all documents
+        def booking_label(bid):
+            return f"📎 {bookings[bid]['name']} ({bookings[bid]['type']}, {bookings[bid]['uploaded_date']})"
+        
+        col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+        with col1:
+            selected = st.selectbox(
+                "Download file",
+                options=list(bookings),
+                format_func=booking_label,
+                key=f"download_select_{active_session['id']}"
+            )
+        with col2:
+            booking = bookings[selected]
+            st.download_button(
+                label="⬇️ Download",
+                data=Path(booking['path']).read_bytes(),  # Only the selected document is read
+                file_name=booking['name'],
+                mime=booking['file_type'],
+                key=f"download_booking_{active_session['id']}",
+                use_container_width=True
+            )
+        
+        col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+        with col1:
+            to_delete = st.multiselect(
+                "Delete documents",
+                options=list(bookings),
+                format_func=booking_label,
+                key=f"delete_select_{active_session['id']}"
+            )
+        with col2:
+            st.button("🗑️ Delete selected", key=f"delete_bookings_{active_session['id']}", disabled=not to_delete,
+                      use_container_width=True, on_click=delete_selected_bookings, args=(active_session,))
+        
+        # Summary stats
+        st.info(f"📊 Total documents: {len(active_session['bookings'])} | Total size: {active_session['bookings_total_size'] / 1024:.1f} KB")
+        
+        # Bulk actions
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("🗑️ Clear All Documents", key=f"clear_all_{active_session['id']}", help="Delete all uploaded documents",
+                      on_click=clear_bookings, args=(active_session,))
+        
+    else:
+        st.info("📭 No documents uploaded yet. Use the upload section above to add your bookings and tickets.")
+
+
 # Main content area
 if st.session_state.active_session:
     # Get active session data
-    active_session = next((s for s in st.session_state.travel_sessions if s['id'] == st.session_state.active_session), None)
+    active_session = st.session_state.travel_sessions.get(st.session_state.active_session)
     
     if active_session:
+        # Only the active session keeps its plan in memory
+        if not load_session(active_session):
+            st.warning("⚠️ The saved plan for this trip is no longer available. Generate it again to restore it.")
+        
         # Create fixed map panel HTML with Streamlit toggle button
         if active_session['destination']:
-            destination_encoded = active_session['destination'].replace(' ', '+')
-            origin_encoded = active_session['origin'].replace(' ', '+') if active_session['origin'] else ''
-            
             # Initialize map location
             if 'map_location' not in active_session:
                 active_session['map_location'] = active_session['destination']
             
             current_map_location = active_session.get('map_location', active_session['destination'])
-            current_map_encoded = current_map_location.replace(' ', '+')
-            
-            # Panel visibility class
-            panel_class = "" if st.session_state.map_visible else "hidden"
+            current_map_encoded = _qp(current_map_location)
             
-            # Create the simplified map panel (just the map)
-            map_html = f"""
-            <style>
-                /* Apply content width adjustment */
-                section.main > div {{
-                    padding-right: {'20px' if not st.session_state.map_visible else '420px'} !important;
-                }}
-            </style>
-            
-            <div class="map-panel {panel_class}">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;">
-                    <h3 style="margin: 0;">🗺️ Travel Map</h3>
-                </div>
-                <iframe
-                    width="100%"
-                    height="500"
-                    frameborder="0"
-                    style="border:0; border-radius: 8px; display: block;"
-                    src="https://maps.google.com/maps?q={current_map_encoded}&t=&z=13&ie=UTF8&iwloc=&output=embed"
-                    allowfullscreen>
-                </iframe>
-                <p style="font-size: 12px; color: #666; margin: 10px 0; text-align: center;">� {current_map_location}</p>
-            </div>
-            """
-            st.markdown(map_html, unsafe_allow_html=True)
+            st.markdown(build_map_html(current_map_encoded, current_map_location, st.session_state.map_visible), unsafe_allow_html=True)
             
             # Add close/open button inside the map panel or as a floating button
             if st.session_state.map_visible:
                 # Close button inside map panel
-                st.markdown("""
-                <style>
-                    div[data-testid="column"]:has(button[key*="close_map"]) {
-                        position: fixed !important;
-                        right: 20px !important;
-                        top: 90px !important;
-                        z-index: 1000 !important;
-                        width: auto !important;
-                    }
-                </style>
-                """, unsafe_allow_html=True)
+                st.markdown(_CLOSE_MAP_BUTTON_CSS, unsafe_allow_html=True)
                 
 
                 if st.button("✖️", key=f"close_map_{active_session['id']}", help="Close map panel", type="secondary"):
@@ -766,17 +1358,7 @@ if st.session_state.active_session:
                     st.rerun()
             else:
                 # Show open button when map is hidden
-                st.markdown("""
-                <style>
-                    div[data-testid="column"]:has(button[key*="open_map"]) {
-                        position: fixed !important;
-                        right: 20px !important;
-                        top: 90px !important;
-                        z-index: 1000 !important;
-                        width: auto !important;
-                    }
-                </style>
-                """, unsafe_allow_html=True)
+                st.markdown(_OPEN_MAP_BUTTON_CSS, unsafe_allow_html=True)
                 
                 col_spacer, col_open = st.columns([20, 1])
                 with col_open:
@@ -861,22 +1443,26 @@ if st.session_state.active_session:
             with col4:
                 currency = st.selectbox(
                     "Currency",
-                    options=["PHP", "USD", "EUR", "GBP", "JPY", "AUD", "CAD", "SGD", "HKD", "CNY"],
-                    index=["PHP", "USD", "EUR", "GBP", "JPY", "AUD", "CAD", "SGD", "HKD", "CNY"].index(active_session['currency']),
+                    options=CURRENCIES,
+                    index=CURRENCY_IDX[active_session['currency']],
                     help="Choose your preferred currency",
                     key=f"currency_{active_session['id']}"
                 )
                 active_session['currency'] = currency
             
             with col5:
+                # Remember the budget entered for each currency so switching back restores it
+                if 'budgets' not in active_session:
+                    active_session['budgets'] = {active_session['currency']: float(active_session['budget'])}
                 budget = st.number_input(
                     f"Budget ({currency})",
                     min_value=0.0,
-                    value=float(active_session['budget']) if currency == active_session['currency'] else (100000.0 if currency == "PHP" else 2000.0),
+                    value=active_session['budgets'].get(currency, 100000.0 if currency == "PHP" else 2000.0),
                     step=1000.0 if currency == "PHP" else 100.0,
                     help="Total budget for your trip",
-                    key=f"budget_{active_session['id']}"
+                    key=f"budget_{active_session['id']}_{currency}"
                 )
+                active_session['budgets'][currency] = budget
                 active_session['budget'] = budget
             
             st.markdown("---")
@@ -898,8 +1484,8 @@ if st.session_state.active_session:
                 
                 style = st.radio(
                     "Travel Style",
-                    options=["Nature & Outdoors", "City & Culture", "Balanced Mix"],
-                    index=["Nature & Outdoors", "City & Culture", "Balanced Mix"].index(active_session['style']),
+                    options=STYLES,
+                    index=STYLE_IDX[active_session['style']],
                     help="What type of experiences do you prefer?",
                     key=f"style_{active_session['id']}"
                 )
@@ -911,20 +1497,8 @@ if st.session_state.active_session:
                     active_session['custom_activities'] = []
                 
                 # Combine default and custom activities for options
-                default_activities = [
-                    "Adventure Sports",
-                    "Cultural & Historical Sites",
-                    "Food & Dining",
-                    "Shopping",
-                    "Photography",
-                    "Nightlife",
-                    "Wellness & Spa",
-                    "Beach & Water Activities",
-                    "Art & Museums",
-                    "Local Experiences"
-                ]
-                
-                all_activities = default_activities + active_session['custom_activities']
+                custom = active_session['custom_activities']
+                all_activities = DEFAULT_ACTIVITIES + tuple(custom) if custom else DEFAULT_ACTIVITIES
                 
                 activities = st.multiselect(
                     "Preferred Activities",
@@ -957,8 +1531,8 @@ if st.session_state.active_session:
             with col3:
                 accommodation = st.selectbox(
                     "Accommodation Type",
-                    options=["Budget Hostels", "Mid-range Hotels", "Luxury Hotels", "Boutique Hotels", "Vacation Rentals/Airbnb"],
-                    index=["Budget Hostels", "Mid-range Hotels", "Luxury Hotels", "Boutique Hotels", "Vacation Rentals/Airbnb"].index(active_session['accommodation']),
+                    options=ACCOMMODATIONS,
+                    index=ACCOMMODATION_IDX[active_session['accommodation']],
                     help="What type of accommodation do you prefer?",
                     key=f"accommodation_{active_session['id']}"
                 )
@@ -966,8 +1540,8 @@ if st.session_state.active_session:
             
             food = st.selectbox(
                 "Food Preference",
-                options=["Street Food & Local Eats", "Mix of Local & International", "Fine Dining", "Vegetarian/Vegan", "No Preference"],
-                index=["Street Food & Local Eats", "Mix of Local & International", "Fine Dining", "Vegetarian/Vegan", "No Preference"].index(active_session['food']),
+                options=FOODS,
+                index=FOOD_IDX[active_session['food']],
                 help="What's your dining style?",
                 key=f"food_{active_session['id']}"
             )
@@ -992,13 +1566,8 @@ if st.session_state.active_session:
                     trip_duration = (end_date - start_date).days
                     
                     # Prepare preferences
-                    preferences = {
-                        'pace': pace,
-                        'style': style,
-                        'activities': ', '.join(activities) if activities else 'General sightseeing',
-                        'accommodation': accommodation,
-                        'food': food
-                    }
+                    preferences = session_preferences(active_session)
+                    plan_args = session_plan_args(active_session)
                     
                     # Display trip summary
                     st.info(f"**Trip Summary**: {origin} → {destination} | {trip_duration} days | Budget: {budget:,.2f} {currency}")
@@ -1015,49 +1584,31 @@ if st.session_state.active_session:
                             st.write(f"**Activities:** {preferences['activities']}")
                     
                     # Add Google Maps link for destination
-                    maps_url = f"https://www.google.com/maps/search/{destination.replace(' ', '+')}"
+                    maps_url = f"https://www.google.com/maps/search/{_qp(destination)}"
                     st.markdown(f"🗺️ [View {destination} on Google Maps]({maps_url})")
                     
                     # Generate travel plan
                     with st.spinner("🤖 AI is searching and planning your perfect trip..."):
                         try:
-                            travel_plan = generate_travel_plan(origin, destination, start_date, end_date, budget, currency, preferences, active_session['num_travelers'])
+                            travel_plan = generate_travel_plan(*plan_args, preview=st.empty())
                             
                             st.success("✅ Your travel plan is ready!")
                             st.markdown("---")
                             
                             # Parse and display the travel plan beautifully
-                            all_dataframes = parse_and_display_travel_plan(travel_plan, currency, trip_duration, start_date)
+                            parsed_plan = parse_and_display_travel_plan(travel_plan, currency, trip_duration, start_date)
+                            all_dataframes = parsed_plan['dataframes']
                             
                             # Store in session
                             active_session['travel_plan'] = travel_plan
                             active_session['dataframes'] = all_dataframes
+                            active_session['parsed_plan'] = parsed_plan
+                            active_session['plan_args'] = plan_args
                             
                             st.markdown("---")
                             
                             # Display Trip Summary at the end
-                            if active_session['destination']:
-                                trip_col1, trip_col2 = st.columns([2, 1])
-                                
-                                with trip_col1:
-                                    st.markdown("### 📋 Trip Summary")
-                                    summary_col1, summary_col2 = st.columns(2)
-                                    with summary_col1:
-                                        st.markdown(f"**🌍 Destination:** {active_session['destination']}")
-                                        st.markdown(f"**📅 Duration:** {(active_session['end_date'] - active_session['start_date']).days} days")
-                                        st.markdown(f"**👥 Travelers:** {active_session.get('num_travelers', 1)} {'person' if active_session.get('num_travelers', 1) == 1 else 'people'}")
-                                    with summary_col2:
-                                        st.markdown(f"**💰 Budget:** {active_session['budget']:,.0f} {active_session['currency']}")
-                                        st.markdown(f"**✈️ Dates:** {active_session['start_date'].strftime('%b %d, %Y')} - {active_session['end_date'].strftime('%b %d, %Y')}")
-                                
-                                with trip_col2:
-                                    st.markdown("### 🔗 Quick Links")
-                                    destination_encoded = active_session['destination'].replace(' ', '+')
-                                    origin_encoded = active_session['origin'].replace(' ', '+') if active_session['origin'] else ''
-                                    
-                                    st.markdown(f"[📍 View {active_session['destination']} on Maps](https://www.google.com/maps/search/{destination_encoded})")
-                                    if origin_encoded:
-                                        st.markdown(f"[🧭 Get Directions from {active_session['origin']}](https://www.google.com/maps/dir/{origin_encoded}/{destination_encoded})")
+                            render_trip_summary(active_session)
                             
                             st.markdown("---")
                             
@@ -1065,7 +1616,7 @@ if st.session_state.active_session:
                             if all_dataframes:
                                 col1, col2, col3 = st.columns([3, 1, 1])
                                 with col3:
-                                    excel_data = create_excel_export(all_dataframes, destination)
+                                    excel_data = create_excel_export(all_dataframes, destination, travel_plan)
                                     st.download_button(
                                         label="📊 Export to Excel",
                                         data=excel_data,
@@ -1100,39 +1651,22 @@ if st.session_state.active_session:
                 
                 st.markdown("---")
                 
-                # Display the saved plan
-                all_dataframes = parse_and_display_travel_plan(
+                # Display the saved plan, reusing the tables parsed when it was generated
+                parsed_plan = parse_and_display_travel_plan(
                     active_session['travel_plan'], 
                     active_session['currency'], 
                     trip_duration, 
-                    active_session['start_date']
+                    active_session['start_date'],
+                    parsed_plan=active_session.get('parsed_plan')
                 )
+                all_dataframes = parsed_plan['dataframes']
+                active_session['dataframes'] = all_dataframes
+                active_session['parsed_plan'] = parsed_plan
                 
                 st.markdown("---")
                 
                 # Display Trip Summary at the end
-                if active_session['destination']:
-                    trip_col1, trip_col2 = st.columns([2, 1])
-                    
-                    with trip_col1:
-                        st.markdown("### 📋 Trip Summary")
-                        summary_col1, summary_col2 = st.columns(2)
-                        with summary_col1:
-                            st.markdown(f"**🌍 Destination:** {active_session['destination']}")
-                            st.markdown(f"**📅 Duration:** {(active_session['end_date'] - active_session['start_date']).days} days")
-                            st.markdown(f"**👥 Travelers:** {active_session.get('num_travelers', 1)} {'person' if active_session.get('num_travelers', 1) == 1 else 'people'}")
-                        with summary_col2:
-                            st.markdown(f"**💰 Budget:** {active_session['budget']:,.0f} {active_session['currency']}")
-                            st.markdown(f"**✈️ Dates:** {active_session['start_date'].strftime('%b %d, %Y')} - {active_session['end_date'].strftime('%b %d, %Y')}")
-                    
-                    with trip_col2:
-                        st.markdown("### 🔗 Quick Links")
-                        destination_encoded = active_session['destination'].replace(' ', '+')
-                        origin_encoded = active_session['origin'].replace(' ', '+') if active_session['origin'] else ''
-                        
-                        st.markdown(f"[📍 View {active_session['destination']} on Maps](https://www.google.com/maps/search/{destination_encoded})")
-                        if origin_encoded:
-                            st.markdown(f"[🧭 Get Directions from {active_session['origin']}](https://www.google.com/maps/dir/{origin_encoded}/{destination_encoded})")
+                render_trip_summary(active_session)
                 
                 st.markdown("---")
                 
@@ -1140,7 +1674,7 @@ if st.session_state.active_session:
                 if all_dataframes:
                     col1, col2, col3 = st.columns([3, 1, 1])
                     with col3:
-                        excel_data = create_excel_export(all_dataframes, active_session['destination'])
+                        excel_data = create_excel_export(all_dataframes, active_session['destination'], active_session['travel_plan'])
                         st.download_button(
                             label="📊 Export to Excel",
                             data=excel_data,
@@ -1152,124 +1686,7 @@ if st.session_state.active_session:
                         )
         
         with tab2:
-            # Bookings & Tickets Section
-            st.header("🎫 Bookings & Tickets")
-            st.markdown("Upload and manage your flight bookings, hotel confirmations, activity tickets, and other travel documents here.")
-            
-            # Initialize bookings list if not exists
-            if 'bookings' not in active_session:
-                active_session['bookings'] = []
-            
-            # Upload section
-            st.subheader("📤 Upload Documents")
-            
-            col1, col2 = st.columns([2, 1])
-            with col1:
-                uploaded_files = st.file_uploader(
-                    "Choose files to upload",
-                    type=['pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx', 'txt'],
-                    accept_multiple_files=True,
-                    key=f"uploader_{active_session['id']}",
-                    help="Upload your booking confirmations, tickets, vouchers, etc."
-                )
-            
-            with col2:
-                document_type = st.selectbox(
-                    "Document Type",
-                    options=["✈️ Flight Booking", "🏨 Hotel Confirmation", "🎟️ Activity Ticket", "🚗 Car Rental", "🚂 Train/Bus Ticket", "📄 Other"],
-                    key=f"doc_type_{active_session['id']}"
-                )
-            
-            document_notes = st.text_area(
-                "Notes (optional)",
-                placeholder="Add any notes about this booking...",
-                key=f"notes_{active_session['id']}",
-                height=100
-            )
-            
-            if uploaded_files:
-                if st.button("💾 Save Documents", type="primary", key=f"save_docs_{active_session['id']}"):
-                    for uploaded_file in uploaded_files:
-                        # Read file bytes
-                        file_bytes = uploaded_file.read()
-                        
-                        # Create booking entry
-                        booking = {
-                            'id': len(active_session['bookings']) + 1,
-                            'name': uploaded_file.name,
-                            'type': document_type,
-                            'size': len(file_bytes),
-                            'file_type': uploaded_file.type,
-                            'bytes': file_bytes,
-                            'notes': document_notes,
-                            'uploaded_date': datetime.now().strftime('%Y-%m-%d %H:%M')
-                        }
-                        
-                        active_session['bookings'].append(booking)
-                    
-                    st.success(f"✅ {len(uploaded_files)} document(s) saved successfully!")
-                    st.rerun()
-            
-            st.markdown("---")
-            
-            # Display saved bookings
-            st.subheader("📚 Saved Documents")
-            
-            if active_session['bookings']:
-                # Group by document type
-                booking_types = {}
-                for booking in active_session['bookings']:
-                    doc_type = booking['type']
-                    if doc_type not in booking_types:
-                        booking_types[doc_type] = []
-                    booking_types[doc_type].append(booking)
-                
-                # Display by category
-                for doc_type, bookings_list in booking_types.items():
-                    with st.expander(f"{doc_type} ({len(bookings_list)})", expanded=True):
-                        for booking in bookings_list:
-                            col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
-                            
-                            with col1:
-                                st.markdown(f"**📎 {booking['name']}**")
-                                if booking['notes']:
-                                    st.caption(booking['notes'])
-                            
-                            with col2:
-                                st.caption(f"📅 {booking['uploaded_date']}")
-                                st.caption(f"📦 {booking['size'] / 1024:.1f} KB")
-                            
-                            with col3:
-                                # Download button
-                                st.download_button(
-                                    label="⬇️ Download",
-                                    data=booking['bytes'],
-                                    file_name=booking['name'],
-                                    mime=booking['file_type'],
-                                    key=f"download_booking_{active_session['id']}_{booking['id']}",
-                                    use_container_width=True
-                                )
-                            
-                            with col4:
-                                # Delete button
-                                if st.button("🗑️", key=f"delete_booking_{active_session['id']}_{booking['id']}", help="Delete this document"):
-                                    active_session['bookings'] = [b for b in active_session['bookings'] if b['id'] != booking['id']]
-                                    st.rerun()
-                            
-                            st.markdown("---")
-                
-                # Summary stats
-                st.info(f"📊 Total documents: {len(active_session['bookings'])} | Total size: {sum(b['size'] for b in active_session['bookings']) / 1024:.1f} KB")
-                
-                # Bulk actions
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("🗑️ Clear All Documents", key=f"clear_all_{active_session['id']}", help="Delete all uploaded documents"):
-                        active_session['bookings'] = []
-                        st.rerun()
-                
-            else:
-                st.info("📭 No documents uploaded yet. Use the upload section above to add your bookings and tickets.")
+            _render_bookings(active_session)
 
 else:
     # Welcome message when no session is active
@@ -1317,6 +1734,28 @@ else:
         st.image("https://images.unsplash.com/photo-1523906834658-6e24ef2386f9", use_container_width=True)
         st.caption("Santorini, Greece")
 
+# Regenerate every plan whose trip details changed, in parallel
+pending_sessions = stale_sessions()
+if pending_sessions:
+    with regenerate_slot:
+        if st.button(f"🔄 Regenerate stale plans ({len(pending_sessions)})", use_container_width=True):
+            with st.spinner("🤖 Regenerating travel plans..."):
+                try:
+                    failures = generate_travel_plans(pending_sessions)
+                except Exception as e:
+                    # The Gemini client could not be created, so nothing was generated
+                    failures = [f"{e}. Please check your GEMINI_API_KEY in the .env file and try again."]
+            for session in pending_sessions:
+                if session['id'] != st.session_state.active_session:
+                    save_session(session)
+            # Rerun even after failures so the successful plans show right away
+            st.session_state.regenerate_failures = failures
+            st.rerun()
+
+regenerate_failures = st.session_state.pop('regenerate_failures', None)
+if regenerate_failures:
+    regenerate_slot.error("❌ Some plans could not be generated:\n\n" + "\n\n".join(regenerate_failures))
+
 # Footer
 st.markdown("---")
 st.markdown(